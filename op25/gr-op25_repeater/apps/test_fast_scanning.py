@@ -8,6 +8,10 @@ Validates SDS100-like scanning speeds of 2+ sites per second
 import sys
 import time
 import json
+import collections
+import heapq
+
+from test_multi_site import MockTime
 
 # Fast scanning constants from tk_p25.py
 FAST_SCAN_TIMEOUT = 0.5
@@ -22,9 +26,20 @@ THOROUGH_SCAN_TIMEOUT = 8.0
 THOROUGH_ACTIVITY_THRESHOLD = 2.0
 THOROUGH_SWITCH_DELAY = 0.5
 
+# Scanning mode parameters: (scan timeout, activity threshold, switch delay)
+MODE_PARAMS = {
+    'fast':     (FAST_SCAN_TIMEOUT, FAST_ACTIVITY_THRESHOLD, FAST_SWITCH_DELAY),
+    'thorough': (THOROUGH_SCAN_TIMEOUT, THOROUGH_ACTIVITY_THRESHOLD, THOROUGH_SWITCH_DELAY),
+    'priority': (PRIORITY_SCAN_TIMEOUT, PRIORITY_ACTIVITY_THRESHOLD, PRIORITY_SWITCH_DELAY),
+}
+
 CC_TIMEOUT_RETRIES = 3
+CC_FAILURE_RESET_THRESHOLD = 3
 
 class site_info(object):
+    __slots__ = ('site_id', 'name', 'control_channels', 'location', 'cc_index', 'cc_retries',
+                 'last_tsbk', 'active_calls', 'signal_quality', 'locked', 'last_activity', 'failure_count')
+    
     def __init__(self, site_id, name, control_channels, location=None):
         self.site_id = site_id
         self.name = name
@@ -64,7 +79,32 @@ class site_info(object):
     def has_recent_activity(self, current_time, threshold):
         return (current_time - self.last_activity) < threshold
 
+def _decide_switch(site, last_switch, now, timeout, threshold, fail_limit):
+    if (now - site.last_activity) < threshold:
+        return False, True
+    if (now - last_switch) >= timeout:
+        return True, False
+    if fail_limit > 0 and site.failure_count >= fail_limit:
+        site.failure_count = 0
+        return True, False
+    return False, False
+
 class multi_site_scanner(object):
+    __slots__ = ('sites', 'debug', 'current_site_id', 'last_site_switch', 'scan_enabled', 'site_switch_count',
+                 'scanning_mode', 'immediate_activity', 'priority_sites', '_priority_expiry_heap', 'last_activity_check',
+                 '_site_order', '_site_index', '_scan_order', '_scan_order_dirty', '_site_pos', '_current_idx',
+                 '_current_site',
+                 'scan_timeout', 'activity_threshold', 'switch_delay', '_priority_expiry_window',
+                 '_should_switch_impl', '_update_activity_impl',
+                 'scan_rate_history', '_rate_sum', '_cached_scan_rate', '_rate_dirty', 'last_scan_time',
+                 '_pending_activity')
+    
+    _MODE_HANDLERS = {
+        'fast':     ('_should_switch_marking', '_mark_priority'),
+        'thorough': ('_should_switch_thorough', '_update_activity_thorough'),
+        'priority': ('_should_switch_marking', '_mark_priority'),
+    }
+    
     def __init__(self, sites, debug=0, scanning_mode='fast'):
         self.sites = sites
         self.debug = debug
@@ -74,47 +114,83 @@ class multi_site_scanner(object):
         self.site_switch_count = 0
         self.scanning_mode = scanning_mode
         self.immediate_activity = False
-        self.priority_sites = {}
+        self.priority_sites = collections.OrderedDict()
+        self._priority_expiry_heap = []
         self.last_activity_check = 0.0
         
-        self.scan_rate_history = []
+        self._site_order = list(self.sites.keys())
+        self._site_index = {site_id: idx for idx, site_id in enumerate(self._site_order)}
+        self._scan_order = list(range(len(self._site_order)))
+        self._scan_order_dirty = True
+        self._site_pos = 0
+        self._current_idx = 0
+        self._current_site = None
+        
+        self.scan_rate_history = collections.deque(maxlen=10)
+        self._rate_sum = 0.0
+        self._cached_scan_rate = 0.0
+        self._rate_dirty = True
         self.last_scan_time = 0.0
         
+        self._pending_activity = collections.deque()
+        
         self.set_scanning_mode(scanning_mode)
         
         if self.sites:
-            self.current_site_id = list(self.sites.keys())[0]
+            self.current_site_id = next(iter(self.sites))
+            self._current_site = self.sites[self.current_site_id]
             self.sites[self.current_site_id].next_cc()
             
     def set_scanning_mode(self, mode):
         self.scanning_mode = mode
         
-        if mode == 'fast':
-            self.scan_timeout = FAST_SCAN_TIMEOUT
-            self.activity_threshold = FAST_ACTIVITY_THRESHOLD  
-            self.switch_delay = FAST_SWITCH_DELAY
-        elif mode == 'thorough':
-            self.scan_timeout = THOROUGH_SCAN_TIMEOUT
-            self.activity_threshold = THOROUGH_ACTIVITY_THRESHOLD
-            self.switch_delay = THOROUGH_SWITCH_DELAY
-        elif mode == 'priority':
-            self.scan_timeout = PRIORITY_SCAN_TIMEOUT
-            self.activity_threshold = PRIORITY_ACTIVITY_THRESHOLD
-            self.switch_delay = PRIORITY_SWITCH_DELAY
-        else:
-            self.scan_timeout = FAST_SCAN_TIMEOUT
-            self.activity_threshold = FAST_ACTIVITY_THRESHOLD
-            self.switch_delay = FAST_SWITCH_DELAY
+        self.scan_timeout, self.activity_threshold, self.switch_delay = MODE_PARAMS.get(mode, MODE_PARAMS['fast'])
+        self._priority_expiry_window = self.activity_threshold * 10
+        switch_impl, activity_impl = self._MODE_HANDLERS.get(mode, self._MODE_HANDLERS['fast'])
+        self._should_switch_impl = getattr(self, switch_impl)
+        self._update_activity_impl = getattr(self, activity_impl)
+            
+        self._scan_order_dirty = True
             
         if self.debug >= 1:
             print(f'Scanner mode: {mode}, timeout: {self.scan_timeout:.3f}s, threshold: {self.activity_threshold:.3f}s, delay: {self.switch_delay:.3f}s')
             
+    def _get_scan_order(self):
+        if self._scan_order_dirty:
+            if self.scanning_mode == 'priority' and self.priority_sites:
+                self._scan_order = ([self._site_index[s] for s in self.priority_sites] +
+                                    [i for i, s in enumerate(self._site_order) if s not in self.priority_sites])
+            else:
+                self._scan_order = list(range(len(self._site_order)))
+            self._site_pos = self._scan_order.index(self._current_idx) if self._scan_order else 0
+            self._scan_order_dirty = False
+        return self._scan_order
+        
+    def _mark_priority(self, site_id, timestamp):
+        priority_count = len(self.priority_sites)
+        self.priority_sites[site_id] = timestamp
+        if len(self.priority_sites) != priority_count:
+            self._scan_order_dirty = True
+            heapq.heappush(self._priority_expiry_heap, (timestamp + self._priority_expiry_window, site_id))
+        
+    def _expire_priority_sites(self, current_time):
+        heap = self._priority_expiry_heap
+        priority_sites = self.priority_sites
+        while heap and heap[0][0] < current_time:
+            site_id = heap[0][1]
+            expiry_time = priority_sites[site_id] + self._priority_expiry_window
+            if expiry_time < current_time:
+                heapq.heappop(heap)
+                del priority_sites[site_id]
+                self._scan_order_dirty = True
+            else:
+                heapq.heapreplace(heap, (expiry_time, site_id))
+            
     def get_current_site(self):
-        if self.current_site_id and self.current_site_id in self.sites:
-            return self.sites[self.current_site_id]
-        return None
+        return self.sites.get(self.current_site_id)
         
     def switch_to_next_site(self, current_time):
+        self._drain_pending(current_time)
         if not self.scan_enabled or not self.sites:
             return False
             
@@ -124,24 +200,19 @@ class multi_site_scanner(object):
         # Track scan rate performance
         if self.last_scan_time > 0:
             scan_interval = current_time - self.last_scan_time
+            if len(self.scan_rate_history) == self.scan_rate_history.maxlen:
+                self._rate_sum -= self.scan_rate_history[0]  # Oldest interval is evicted by append
             self.scan_rate_history.append(scan_interval)
-            if len(self.scan_rate_history) > 10:
-                self.scan_rate_history.pop(0)
+            self._rate_sum += scan_interval
+            self._rate_dirty = True
         self.last_scan_time = current_time
         
         # Priority mode: check priority sites first
-        if self.scanning_mode == 'priority' and self.priority_sites:
-            priority_list = list(self.priority_sites.keys())
-            site_list = priority_list + [s for s in self.sites.keys() if s not in priority_list]
-        else:
-            site_list = list(self.sites.keys())
-            
-        if self.current_site_id in site_list:
-            current_idx = site_list.index(self.current_site_id)
-            next_idx = (current_idx + 1) % len(site_list)
-            self.current_site_id = site_list[next_idx]
-        else:
-            self.current_site_id = site_list[0]
+        scan_order = self._get_scan_order()
+        self._site_pos = (self._site_pos + 1) % len(scan_order)
+        self._current_idx = scan_order[self._site_pos]
+        self.current_site_id = self._site_order[self._current_idx]
+        self._current_site = self.sites[self.current_site_id]
             
         self.last_site_switch = current_time
         self.site_switch_count += 1
@@ -151,75 +222,63 @@ class multi_site_scanner(object):
             current_site.next_cc()
             
         if self.debug >= 2:
-            avg_rate = sum(self.scan_rate_history) / len(self.scan_rate_history) if self.scan_rate_history else 0
-            sites_per_sec = 1.0 / avg_rate if avg_rate > 0 else 0
-            print(f'Switched to site {self.current_site_id} ({current_site.name if current_site else "unknown"}) [%.1f sites/sec]' % sites_per_sec)
+            print(f'Switched to site {self.current_site_id} ({current_site.name if current_site else "unknown"}) [%.1f sites/sec]' % self.get_scan_rate())
         return True
         
     def should_switch_site(self, current_time):
+        self._drain_pending(current_time)
         if not self.scan_enabled:
             return False
             
-        current_site = self.get_current_site()
-        if not current_site:
-            return True
-            
-        # Fast mode: immediate switching unless very recent activity
-        if self.scanning_mode == 'fast':
-            if current_site.has_recent_activity(current_time, self.activity_threshold):
-                self.priority_sites[self.current_site_id] = current_time
-                return False
-                
-            time_on_site = current_time - self.last_site_switch  
-            return time_on_site >= self.scan_timeout
-            
-        # Priority mode: balance speed with activity detection
-        elif self.scanning_mode == 'priority':
-            if current_site.has_recent_activity(current_time, self.activity_threshold):
-                self.priority_sites[self.current_site_id] = current_time
-                return False
-                
-            time_on_site = current_time - self.last_site_switch
-            return time_on_site >= self.scan_timeout
-            
-        # Thorough mode
-        else:
-            if current_site.has_recent_activity(current_time, self.activity_threshold):
-                return False
-                
-            time_on_site = current_time - self.last_site_switch
-            if time_on_site >= self.scan_timeout:
-                return True
-                
-            if current_site.failure_count >= 3:
-                current_site.failure_count = 0
-                return True
-                
-        return False
+        return self._should_switch_impl(current_time)
+        
+    # Fast and priority modes: switch on timeout unless very recent activity
+    def _should_switch_marking(self, current_time):
+        switch, active = _decide_switch(self._current_site, self.last_site_switch, current_time,
+                                        self.scan_timeout, self.activity_threshold, 0)
+        if active:
+            self._mark_priority(self.current_site_id, current_time)
+        return switch
         
+    # Thorough mode
+    def _should_switch_thorough(self, current_time, _fail_limit=CC_FAILURE_RESET_THRESHOLD):
+        return _decide_switch(self._current_site, self.last_site_switch, current_time,
+                              self.scan_timeout, self.activity_threshold, _fail_limit)[0]
+        
+    # Activity is queued and applied on the next should_switch_site/switch_to_next_site call
     def update_site_activity(self, site_id, timestamp):
-        if site_id in self.sites:
-            self.sites[site_id].update_activity(timestamp)
-            if self.scanning_mode in ['fast', 'priority']:
-                self.priority_sites[site_id] = timestamp
-                
+        self._pending_activity.append((site_id, timestamp))
+        
+    def _drain_pending(self, current_time):
+        pending = self._pending_activity
+        if not pending:
+            return
+        sites = self.sites
+        update_impl = self._update_activity_impl
+        while pending:
+            site_id, timestamp = pending.popleft()
+            site = sites.get(site_id)
+            if site is not None:
+                site.update_activity(timestamp)
+                update_impl(site_id, timestamp)
         # Clean up old priority sites
-        cutoff_time = timestamp - (self.activity_threshold * 10)
-        expired_sites = [s for s, t in self.priority_sites.items() if t < cutoff_time]
-        for site in expired_sites:
-            del self.priority_sites[site]
+        self._expire_priority_sites(current_time)
             
+    def _update_activity_thorough(self, site_id, timestamp):
+        pass
+        
     def get_scan_rate(self):
-        if not self.scan_rate_history:
-            return 0.0
-        avg_interval = sum(self.scan_rate_history) / len(self.scan_rate_history)
-        return 1.0 / avg_interval if avg_interval > 0 else 0.0
+        if self._rate_dirty:
+            avg_interval = self._rate_sum / len(self.scan_rate_history) if self.scan_rate_history else 0.0
+            self._cached_scan_rate = 1.0 / avg_interval if avg_interval > 0 else 0.0
+            self._rate_dirty = False
+        return self._cached_scan_rate
 
 def create_test_sites(count=6):
     """Create test sites for scanning"""
     sites = {}
     for i in range(count):
-        site_id = f"site{i+1}"
+        site_id = sys.intern(f"site{i+1}")  # Interned ids let dict lookups short-circuit on identity
         name = f"Test Site {i+1}"
         base_freq = 453000000 + (i * 2000000)  # Spread across spectrum
         control_channels = [base_freq + j*250000 for j in range(3)]
@@ -229,37 +288,55 @@ def create_test_sites(count=6):
         
     return sites
 
-def test_scanning_speed(mode, duration=10.0, site_count=6):
-    """Test scanning speed for a given mode"""
+def test_scanning_speed(mode, duration=10.0, site_count=6, use_mock_time=True):
+    """Test scanning speed for a given mode
+    
+    With use_mock_time the loop runs on simulated time, so only the scanner
+    logic is measured rather than sleep and clock syscall latency
+    """
     print(f"\\n=== Testing {mode.upper()} Scanning Mode ===")
     print(f"Sites: {site_count}, Duration: {duration}s")
     
     sites = create_test_sites(site_count)
     scanner = multi_site_scanner(sites, debug=1, scanning_mode=mode)
+    mock_time = MockTime()
+    mock_time.advance(scanner.scan_timeout)  # Scanner starts with last switch at t=0; first tick may switch as with real time
+    
+    # Simulate small time increments for fast scanning
+    if mode == 'fast':
+        dt = 0.01   # 10ms increments
+    elif mode == 'priority':
+        dt = 0.05   # 50ms increments
+    else:
+        dt = 0.1    # 100ms increments
     
-    start_time = time.time()
+    # Bind loop lookups to locals
+    t_time = time.time
+    t_sleep = time.sleep
+    should_switch_site = scanner.should_switch_site
+    switch_to_next_site = scanner.switch_to_next_site
+    
+    start_time = mock_time.get() if use_mock_time else t_time()
     current_time = start_time
+    elapsed = 0.0
+    ticks = 0
     switches = 0
     
-    while (current_time - start_time) < duration:
-        if scanner.should_switch_site(current_time):
-            if scanner.switch_to_next_site(current_time):
+    while elapsed < duration:
+        if should_switch_site(current_time):
+            if switch_to_next_site(current_time):
                 switches += 1
                 
-        # Simulate small time increments for fast scanning
-        if mode == 'fast':
-            time.sleep(0.01)  # 10ms increments
-            current_time += 0.01
-        elif mode == 'priority': 
-            time.sleep(0.05)  # 50ms increments
-            current_time += 0.05
+        if use_mock_time:
+            # Derive time from the tick count so float error cannot add an extra tick
+            ticks += 1
+            elapsed = ticks * dt
+            current_time = start_time + elapsed
         else:
-            time.sleep(0.1)   # 100ms increments
-            current_time += 0.1
-            
-        current_time = time.time()  # Use real time for accuracy
+            t_sleep(dt)
+            current_time = t_time()  # Use real time for accuracy
+            elapsed = current_time - start_time
         
-    elapsed = current_time - start_time
     scan_rate = switches / elapsed
     
     print(f"Results:")
@@ -294,8 +371,7 @@ def test_activity_handling(mode='fast'):
     
     # Simulate activity on current site
     current_site = scanner.get_current_site()
-    current_site.update_activity(current_time)
-    scanner.priority_sites[scanner.current_site_id] = current_time
+    scanner.update_site_activity(scanner.current_site_id, current_time)
     
     print(f"Added activity to {current_site.name}")
     
@@ -360,6 +436,7 @@ def test_priority_site_handling():
     sites['site4'].update_activity(current_time)
     scanner.update_site_activity('site2', current_time)
     scanner.update_site_activity('site4', current_time)
+    scanner.should_switch_site(current_time)  # Queued activity is applied on the next tick
     
     print(f"Added priority sites: {list(scanner.priority_sites.keys())}")
     
@@ -376,6 +453,38 @@ def test_priority_site_handling():
     print(f"Sites visited: {visited_sites}")
     print(f"Priority sites should appear more frequently")
 
+def profile_scanning(mode='fast', iterations=1000000, site_count=6, stats_file=None):
+    """Profile scanner decision overhead on simulated time
+    
+    stats_file can be opened with snakeviz for a call graph view
+    """
+    import cProfile
+    import pstats
+    
+    print(f"\\n=== Profiling {mode.upper()} Scanning Mode ===")
+    print(f"Sites: {site_count}, Iterations: {iterations}")
+    
+    sites = create_test_sites(site_count)
+    scanner = multi_site_scanner(sites, debug=0, scanning_mode=mode)
+    mock_time = MockTime()
+    
+    def run():
+        advance = mock_time.advance
+        should_switch_site = scanner.should_switch_site
+        switch_to_next_site = scanner.switch_to_next_site
+        for i in range(iterations):
+            current_time = advance(0.01)
+            if should_switch_site(current_time):
+                switch_to_next_site(current_time)
+                
+    profiler = cProfile.Profile()
+    profiler.runcall(run)
+    
+    if stats_file:
+        profiler.dump_stats(stats_file)
+        print(f"Profile written to {stats_file}")
+    pstats.Stats(profiler).sort_stats('cumulative').print_stats(10)
+
 def main():
     """Run all fast scanning tests"""
     try:
@@ -407,4 +516,10 @@ def main():
     return 0
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--profile':
+        # Usage: test_fast_scanning.py --profile [mode] [stats_file]
+        profile_mode = sys.argv[2] if len(sys.argv) > 2 else 'fast'
+        profile_file = sys.argv[3] if len(sys.argv) > 3 else None
+        profile_scanning(profile_mode, stats_file=profile_file)
+        sys.exit(0)
     sys.exit(main())
\ No newline at end of file
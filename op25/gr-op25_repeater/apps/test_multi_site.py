@@ -27,6 +27,7 @@ SITE_SCAN_TIMEOUT = 8.0
 SITE_ACTIVITY_THRESHOLD = 2.0  
 SITE_SWITCH_DELAY = 0.5
 CC_TIMEOUT_RETRIES = 3
+CC_FAILURE_RESET_THRESHOLD = 3
 
 class site_info(object):
     """Test version of site_info class"""
@@ -78,15 +79,15 @@ class multi_site_scanner(object):
         self.last_site_switch = 0.0
         self.scan_enabled = len(sites) > 1
         self.site_switch_count = 0
+        self._site_order = list(self.sites.keys())
+        self._site_pos = 0
         
         if self.sites:
-            self.current_site_id = list(self.sites.keys())[0]
+            self.current_site_id = next(iter(self.sites))
             self.sites[self.current_site_id].next_cc()
             
     def get_current_site(self):
-        if self.current_site_id and self.current_site_id in self.sites:
-            return self.sites[self.current_site_id]
-        return None
+        return self.sites.get(self.current_site_id)
         
     def switch_to_next_site(self, current_time):
         if not self.scan_enabled or not self.sites:
@@ -95,13 +96,8 @@ class multi_site_scanner(object):
         if (current_time - self.last_site_switch) < SITE_SWITCH_DELAY:
             return False
             
-        site_list = list(self.sites.keys())
-        if self.current_site_id in site_list:
-            current_idx = site_list.index(self.current_site_id)
-            next_idx = (current_idx + 1) % len(site_list)
-            self.current_site_id = site_list[next_idx]
-        else:
-            self.current_site_id = site_list[0]
+        self._site_pos = (self._site_pos + 1) % len(self._site_order)
+        self.current_site_id = self._site_order[self._site_pos]
             
         self.last_site_switch = current_time
         self.site_switch_count += 1
@@ -114,7 +110,7 @@ class multi_site_scanner(object):
             print(f'Multi-site scanner: switched to site {self.current_site_id} ({current_site.name if current_site else "unknown"})')
         return True
         
-    def should_switch_site(self, current_time):
+    def should_switch_site(self, current_time, _fail_limit=CC_FAILURE_RESET_THRESHOLD):
         if not self.scan_enabled:
             return False
             
@@ -122,28 +118,25 @@ class multi_site_scanner(object):
         if not current_site:
             return True
             
-        if current_site.has_recent_activity(current_time):
+        if (current_time - current_site.last_activity) < SITE_ACTIVITY_THRESHOLD:
             return False
             
-        time_on_site = current_time - self.last_site_switch
-        if time_on_site >= SITE_SCAN_TIMEOUT:
+        if (current_time - self.last_site_switch) >= SITE_SCAN_TIMEOUT:
             return True
             
-        if current_site.failure_count >= 3:
+        if current_site.failure_count >= _fail_limit:
             current_site.failure_count = 0
             return True
             
         return False
         
     def update_site_activity(self, site_id, timestamp):
-        if site_id in self.sites:
-            self.sites[site_id].update_activity(timestamp)
+        site = self.sites.get(site_id)
+        if site is not None:
+            site.update_activity(timestamp)
 
-def test_basic_functionality():
-    """Test basic site_info and multi_site_scanner functionality"""
-    print("=== Testing Basic Functionality ===")
-    
-    # Create test sites
+def _make_default_scanner():
+    """Build a fresh default three-site scanner so tests cannot affect each other"""
     site1 = site_info("site1", "Downtown", [453000000, 453250000])
     site2 = site_info("site2", "Northside", [460000000, 460250000]) 
     site3 = site_info("site3", "Southside", [462000000, 462250000])
@@ -154,8 +147,14 @@ def test_basic_functionality():
         "site3": site3
     }
     
+    return multi_site_scanner(sites, debug=1)
+
+def test_basic_functionality():
+    """Test basic site_info and multi_site_scanner functionality"""
+    print("=== Testing Basic Functionality ===")
+    
     # Test scanner creation
-    scanner = multi_site_scanner(sites, debug=1)
+    scanner = _make_default_scanner()
     
     print(f"Created scanner with {len(scanner.sites)} sites")
     print(f"Current site: {scanner.get_current_site().name}")
@@ -28,6 +28,7 @@ import json
 import codecs
 import ast
 import threading
+import heapq
 from collections import deque
 from helper_funcs import *
 from log_ts import log_ts
@@ -37,6 +38,7 @@ import gnuradio.op25_repeater as op25_repeater
 #################
 
 CC_TIMEOUT_RETRIES = 3   # Number of control channel framing timeouts before hunting
+CC_FAILURE_RESET_THRESHOLD = 3 # Number of site control channel failures before thorough scan moves on
 VC_TIMEOUT_RETRIES = 3   # Number of voice channel framing timeouts before expiry
 TGID_DEFAULT_PRIO = 3    # Default tgid priority when unassigned
 
@@ -56,8 +58,16 @@ PRIORITY_SCAN_TIMEOUT = 1.0      # Priority scan: 1 second per site
 PRIORITY_ACTIVITY_THRESHOLD = 0.25 # Priority scan: 250ms activity window
 PRIORITY_SWITCH_DELAY = 0.1      # Priority scan: 100ms receiver settling
 
+# Scanning mode parameters: (scan timeout, activity threshold, switch delay)
+MODE_PARAMS = {
+    'fast':     (FAST_SCAN_TIMEOUT, FAST_ACTIVITY_THRESHOLD, FAST_SWITCH_DELAY),
+    'thorough': (THOROUGH_SCAN_TIMEOUT, THOROUGH_ACTIVITY_THRESHOLD, THOROUGH_SWITCH_DELAY),
+    'priority': (PRIORITY_SCAN_TIMEOUT, PRIORITY_ACTIVITY_THRESHOLD, PRIORITY_SWITCH_DELAY),
+}
+
 # Default scanning mode
 DEFAULT_SCANNING_MODE = 'fast'   # Options: 'fast', 'thorough', 'priority'
+SCAN_RATE_HISTORY_LEN = 10       # Number of site switch intervals used for scan rate average
 TGID_HOLD_TIME = 2.0     # Number of seconds to give previously active tgid exclusive channel access
 TGID_SKIP_TIME = 4.0     # Number of seconds to blacklist a previously skipped tgid
 TGID_EXPIRY_TIME = 1.0   # Number of seconds to allow tgid to remain active with no updates received
@@ -337,6 +347,9 @@ class rx_ctl(object):
 #################
 class site_info(object):
     """Information about a P25 site within a system"""
+    __slots__ = ('site_id', 'name', 'control_channels', 'location', 'cc_index', 'cc_retries',
+                 'last_tsbk', 'active_calls', 'signal_quality', 'locked', 'last_activity', 'failure_count')
+    
     def __init__(self, site_id, name, control_channels, location=None):
         self.site_id = site_id
         self.name = name
@@ -381,8 +394,39 @@ class site_info(object):
         """Check if site has recent activity"""
         return (current_time - self.last_activity) < threshold
         
+def _decide_switch(site, last_switch, now, timeout, threshold, fail_limit):
+    """Per-tick site switch decision for the given site, returns (switch, active)
+    
+    active is set when the site has recent activity; fail_limit of 0 disables the
+    control channel failure check, otherwise the failure count is reset on switch.
+    """
+    if (now - site.last_activity) < threshold:
+        return False, True
+    if (now - last_switch) >= timeout:
+        return True, False
+    if fail_limit > 0 and site.failure_count >= fail_limit:
+        site.failure_count = 0
+        return True, False
+    return False, False
+
 class multi_site_scanner(object):
     """Scanner for multiple P25 sites within a system"""
+    __slots__ = ('sites', 'debug', 'current_site_id', 'last_site_switch', 'scan_enabled', 'site_switch_count',
+                 'scanning_mode', 'immediate_activity', 'priority_sites', '_priority_expiry_heap', 'last_activity_check',
+                 '_site_order', '_site_index', '_scan_order', '_scan_order_dirty', '_site_pos', '_current_idx',
+                 '_current_site',
+                 'scan_timeout', 'activity_threshold', 'switch_delay', '_priority_expiry_window',
+                 '_should_switch_impl', '_update_activity_impl',
+                 'scan_rate_history', '_rate_sum', '_cached_scan_rate', '_rate_dirty', 'last_scan_time',
+                 '_pending_activity')
+    
+    # Per-mode switch decision and activity handler method names, bound in set_scanning_mode
+    _MODE_HANDLERS = {
+        'fast':     ('_should_switch_marking', '_mark_priority'),
+        'thorough': ('_should_switch_thorough', '_update_activity_thorough'),
+        'priority': ('_should_switch_marking', '_mark_priority'),
+    }
+    
     def __init__(self, sites, debug=0, scanning_mode='fast'):
         self.sites = sites  # Dictionary of site_id -> site_info
         self.debug = debug
@@ -392,55 +436,100 @@ class multi_site_scanner(object):
         self.site_switch_count = 0
         self.scanning_mode = scanning_mode
         self.immediate_activity = False  # Flag for immediate activity detection
-        self.priority_sites = {}  # Sites with recent activity get priority
+        self.priority_sites = collections.OrderedDict()  # Sites with recent activity get priority
+        self._priority_expiry_heap = []  # (expiry_time, site_id) min-heap, one entry per priority site
         self.last_activity_check = 0.0
         
+        # Precomputed site rotation; _scan_order holds site indices and _site_pos indexes _scan_order
+        self._site_order = list(self.sites.keys())
+        self._site_index = {site_id: idx for idx, site_id in enumerate(self._site_order)}
+        self._scan_order = list(range(len(self._site_order)))
+        self._scan_order_dirty = True  # Rebuild rotation on next switch
+        self._site_pos = 0
+        self._current_idx = 0
+        self._current_site = None  # site_info at _current_idx, read by the switch handlers
+        
         # Set scanning parameters based on mode
         self.set_scanning_mode(scanning_mode)
         
         # Performance tracking
-        self.scan_rate_history = []
+        self.scan_rate_history = deque(maxlen=SCAN_RATE_HISTORY_LEN)
+        self._rate_sum = 0.0  # Running sum of scan_rate_history
+        self._cached_scan_rate = 0.0
+        self._rate_dirty = True  # Recompute _cached_scan_rate on next get_scan_rate()
         self.last_scan_time = 0.0
         
+        # (site_id, timestamp) activity events queued by update_site_activity, see _drain_pending
+        self._pending_activity = deque()
+        
         if self.sites:
             # Start with first site
-            self.current_site_id = list(self.sites.keys())[0]
+            self.current_site_id = next(iter(self.sites))
+            self._current_site = self.sites[self.current_site_id]
             self.sites[self.current_site_id].next_cc()  # Initialize first CC
             
     def set_scanning_mode(self, mode):
         """Set scanning mode and associated parameters"""
         self.scanning_mode = mode
         
-        if mode == 'fast':
-            self.scan_timeout = FAST_SCAN_TIMEOUT
-            self.activity_threshold = FAST_ACTIVITY_THRESHOLD  
-            self.switch_delay = FAST_SWITCH_DELAY
-        elif mode == 'thorough':
-            self.scan_timeout = THOROUGH_SCAN_TIMEOUT
-            self.activity_threshold = THOROUGH_ACTIVITY_THRESHOLD
-            self.switch_delay = THOROUGH_SWITCH_DELAY
-        elif mode == 'priority':
-            self.scan_timeout = PRIORITY_SCAN_TIMEOUT
-            self.activity_threshold = PRIORITY_ACTIVITY_THRESHOLD
-            self.switch_delay = PRIORITY_SWITCH_DELAY
-        else:
-            # Default to fast mode
-            self.scan_timeout = FAST_SCAN_TIMEOUT
-            self.activity_threshold = FAST_ACTIVITY_THRESHOLD
-            self.switch_delay = FAST_SWITCH_DELAY
+        # Unknown modes default to fast mode
+        self.scan_timeout, self.activity_threshold, self.switch_delay = MODE_PARAMS.get(mode, MODE_PARAMS['fast'])
+        self._priority_expiry_window = self.activity_threshold * 10  # Keep priority for 10x threshold
+        
+        # Mode-specific switch decision and activity handling are bound once here
+        switch_impl, activity_impl = self._MODE_HANDLERS.get(mode, self._MODE_HANDLERS['fast'])
+        self._should_switch_impl = getattr(self, switch_impl)
+        self._update_activity_impl = getattr(self, activity_impl)
+            
+        self._scan_order_dirty = True
             
         if self.debug >= 5:
             sys.stderr.write('Multi-site scanner: mode=%s, timeout=%.3fs, threshold=%.3fs, delay=%.3fs\n' %
                            (mode, self.scan_timeout, self.activity_threshold, self.switch_delay))
             
+    def _get_scan_order(self):
+        """Get site rotation order, rebuilding it only after the priority set has changed"""
+        if self._scan_order_dirty:
+            if self.scanning_mode == 'priority' and self.priority_sites:
+                # Priority sites first, then remaining sites in configured order
+                self._scan_order = ([self._site_index[s] for s in self.priority_sites] +
+                                    [i for i, s in enumerate(self._site_order) if s not in self.priority_sites])
+            else:
+                self._scan_order = list(range(len(self._site_order)))
+            self._site_pos = self._scan_order.index(self._current_idx) if self._scan_order else 0
+            self._scan_order_dirty = False
+        return self._scan_order
+        
+    def _mark_priority(self, site_id, timestamp):
+        """Mark site as priority; rotation and expiry heap only change when it is newly added"""
+        priority_count = len(self.priority_sites)
+        self.priority_sites[site_id] = timestamp
+        if len(self.priority_sites) != priority_count:  # Grew, so site is new
+            self._scan_order_dirty = True
+            heapq.heappush(self._priority_expiry_heap, (timestamp + self._priority_expiry_window, site_id))
+        
+    def _expire_priority_sites(self, current_time):
+        """Remove priority sites with no activity for 10x threshold"""
+        heap = self._priority_expiry_heap
+        priority_sites = self.priority_sites
+        while heap and heap[0][0] < current_time:
+            site_id = heap[0][1]
+            expiry_time = priority_sites[site_id] + self._priority_expiry_window
+            if expiry_time < current_time:
+                heapq.heappop(heap)
+                del priority_sites[site_id]
+                self._scan_order_dirty = True
+            else:
+                # Site saw later activity, move its entry to the new expiry time
+                heapq.heapreplace(heap, (expiry_time, site_id))
+            
     def get_current_site(self):
         """Get current active site"""
-        if self.current_site_id and self.current_site_id in self.sites:
-            return self.sites[self.current_site_id]
-        return None
+        return self.sites.get(self.current_site_id)
         
     def switch_to_next_site(self, current_time):
         """Switch to the next site in rotation"""
+        self._drain_pending(current_time)
         if not self.scan_enabled or not self.sites:
             return False
             
@@ -451,24 +540,19 @@ class multi_site_scanner(object):
         # Track scan rate performance
         if self.last_scan_time > 0:
             scan_interval = current_time - self.last_scan_time
+            if len(self.scan_rate_history) == self.scan_rate_history.maxlen:
+                self._rate_sum -= self.scan_rate_history[0]  # Oldest interval is evicted by append
             self.scan_rate_history.append(scan_interval)
-            if len(self.scan_rate_history) > 10:
-                self.scan_rate_history.pop(0)
+            self._rate_sum += scan_interval
+            self._rate_dirty = True
         self.last_scan_time = current_time
             
-        # Priority mode: check priority sites first
-        if self.scanning_mode == 'priority' and self.priority_sites:
-            priority_list = list(self.priority_sites.keys())
-            site_list = priority_list + [s for s in self.sites.keys() if s not in priority_list]
-        else:
-            site_list = list(self.sites.keys())
-            
-        if self.current_site_id in site_list:
-            current_idx = site_list.index(self.current_site_id)
-            next_idx = (current_idx + 1) % len(site_list)
-            self.current_site_id = site_list[next_idx]
-        else:
-            self.current_site_id = site_list[0]
+        # Priority mode rotates through priority sites first
+        scan_order = self._get_scan_order()
+        self._site_pos = (self._site_pos + 1) % len(scan_order)
+        self._current_idx = scan_order[self._site_pos]
+        self.current_site_id = self._site_order[self._current_idx]
+        self._current_site = self.sites[self.current_site_id]
             
         self.last_site_switch = current_time
         self.site_switch_count += 1
@@ -479,82 +563,73 @@ class multi_site_scanner(object):
             current_site.next_cc()
             
         if self.debug >= 5:
-            avg_rate = sum(self.scan_rate_history) / len(self.scan_rate_history) if self.scan_rate_history else 0
-            sites_per_sec = 1.0 / avg_rate if avg_rate > 0 else 0
             sys.stderr.write('%s Multi-site scanner: switched to site %s (%s) [%.1f sites/sec]\n' % 
                            (log_ts.get(current_time), self.current_site_id, 
-                            current_site.name if current_site else "unknown", sites_per_sec))
+                            current_site.name if current_site else "unknown", self.get_scan_rate()))
         return True
         
     def should_switch_site(self, current_time):
         """Determine if we should switch to a different site"""
+        self._drain_pending(current_time)
         if not self.scan_enabled:
             return False
             
-        current_site = self.get_current_site()
-        if not current_site:
-            return True
-            
-        # Fast mode: immediate switching unless very recent activity
-        if self.scanning_mode == 'fast':
-            # Check for immediate activity (TSBK received in last 100ms)
-            if current_site.has_recent_activity(current_time, self.activity_threshold):
-                # Add to priority sites for faster return visits
-                self.priority_sites[self.current_site_id] = current_time
-                return False
-                
-            # Fast switch after short timeout
-            time_on_site = current_time - self.last_site_switch  
-            return time_on_site >= self.scan_timeout
-            
-        # Priority mode: balance speed with activity detection
-        elif self.scanning_mode == 'priority':
-            if current_site.has_recent_activity(current_time, self.activity_threshold):
-                self.priority_sites[self.current_site_id] = current_time
-                return False
-                
-            time_on_site = current_time - self.last_site_switch
-            return time_on_site >= self.scan_timeout
-            
-        # Thorough mode: original logic
-        else:
-            if current_site.has_recent_activity(current_time, self.activity_threshold):
-                return False
-                
-            time_on_site = current_time - self.last_site_switch
-            if time_on_site >= self.scan_timeout:
-                return True
-                
-            # Switch if control channel keeps failing
-            if current_site.failure_count >= 3:
-                current_site.failure_count = 0
-                return True
-                
-        return False
+        # Current site activity is read straight from _current_site by the mode handler
+        return self._should_switch_impl(current_time)
+        
+    def _should_switch_marking(self, current_time):
+        """Fast and priority modes: switch on timeout unless very recent activity"""
+        switch, active = _decide_switch(self._current_site, self.last_site_switch, current_time,
+                                        self.scan_timeout, self.activity_threshold, 0)
+        if active:
+            # Add to priority sites for faster return visits
+            self._mark_priority(self.current_site_id, current_time)
+        return switch
+        
+    def _should_switch_thorough(self, current_time, _fail_limit=CC_FAILURE_RESET_THRESHOLD):
+        """Thorough mode: original logic, also switching if control channel keeps failing"""
+        return _decide_switch(self._current_site, self.last_site_switch, current_time,
+                              self.scan_timeout, self.activity_threshold, _fail_limit)[0]
         
     def update_site_activity(self, site_id, timestamp):
-        """Update activity for a specific site"""
-        if site_id in self.sites:
-            self.sites[site_id].update_activity(timestamp)
-            # Mark as priority site in priority/fast modes
-            if self.scanning_mode in ['fast', 'priority']:
-                self.priority_sites[site_id] = timestamp
-                
-        # Clean up old priority sites
-        cutoff_time = timestamp - (self.activity_threshold * 10)  # Keep priority for 10x threshold
-        expired_sites = [s for s, t in self.priority_sites.items() if t < cutoff_time]
-        for site in expired_sites:
-            del self.priority_sites[site]
+        """Queue activity for a specific site
+        
+        Site state and priority_sites are updated on the next should_switch_site,
+        switch_to_next_site or get_scanning_stats call, not immediately.
+        """
+        self._pending_activity.append((site_id, timestamp))
+        
+    def _drain_pending(self, current_time=None):
+        """Apply all queued activity events, then clean up old priority sites once at current_time"""
+        pending = self._pending_activity
+        if not pending:
+            return
+        sites = self.sites
+        update_impl = self._update_activity_impl
+        while pending:
+            site_id, timestamp = pending.popleft()
+            site = sites.get(site_id)
+            if site is not None:
+                site.update_activity(timestamp)
+                # Mark as priority site in priority/fast modes
+                update_impl(site_id, timestamp)
+        if current_time is not None:
+            self._expire_priority_sites(current_time)
             
+    def _update_activity_thorough(self, site_id, timestamp):
+        """Thorough mode does not track priority sites"""
+        
     def get_scan_rate(self):
         """Get current scanning rate in sites per second"""
-        if not self.scan_rate_history:
-            return 0.0
-        avg_interval = sum(self.scan_rate_history) / len(self.scan_rate_history)
-        return 1.0 / avg_interval if avg_interval > 0 else 0.0
+        if self._rate_dirty:
+            avg_interval = self._rate_sum / len(self.scan_rate_history) if self.scan_rate_history else 0.0
+            self._cached_scan_rate = 1.0 / avg_interval if avg_interval > 0 else 0.0
+            self._rate_dirty = False
+        return self._cached_scan_rate
         
     def get_scanning_stats(self):
         """Get detailed scanning statistics"""
+        self._drain_pending()  # No tick time here, expiry waits for the next tick
         return {
             'mode': self.scanning_mode,
             'sites_per_second': self.get_scan_rate(),